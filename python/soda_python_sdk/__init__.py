@@ -10,7 +10,10 @@ from .crypto import (
     sign,
     sign_eip191,
     prepare_IT,
+    prepare_IT_batch,
+    RSAKeypair,
     generate_rsa_keypair,
+    generate_lazy_rsa_keypair,
     decrypt_rsa,
     recover_user_key,
     keccak256,
@@ -34,7 +37,10 @@ __all__ = [
     'sign',
     'sign_eip191',
     'prepare_IT',
+    'prepare_IT_batch',
+    'RSAKeypair',
     'generate_rsa_keypair',
+    'generate_lazy_rsa_keypair',
     'decrypt_rsa',
     'recover_user_key',
     'keccak256',
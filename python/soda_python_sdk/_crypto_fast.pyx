@@ -0,0 +1,29 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Optional native accelerator for the block XOR used by encrypt and decrypt.
+
+crypto.py falls back to a pure Python implementation when this module isn't built.
+"""
+
+from libc.stdint cimport uint64_t
+from libc.string cimport memcpy
+from cpython.bytes cimport PyBytes_FromStringAndSize
+
+cdef enum:
+    BLOCK_SIZE = 16
+
+
+def xor_block(const unsigned char[::1] a, const unsigned char[::1] b):
+    """XOR two 128-bit blocks as a pair of 64-bit words and return the result as bytes."""
+    cdef uint64_t x[2]
+    cdef uint64_t y[2]
+
+    if a.shape[0] != BLOCK_SIZE or b.shape[0] != BLOCK_SIZE:
+        raise ValueError("Block size must be 128 bits.")
+
+    # Copy into aligned words, the input buffers carry no alignment guarantee
+    memcpy(x, &a[0], BLOCK_SIZE)
+    memcpy(y, &b[0], BLOCK_SIZE)
+    x[0] ^= y[0]
+    x[1] ^= y[1]
+
+    return PyBytes_FromStringAndSize(<char *> x, BLOCK_SIZE)
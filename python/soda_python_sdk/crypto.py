@@ -1,24 +1,70 @@
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
 from Crypto.Hash import keccak
 import os
-import binascii
+import secrets
+import functools
+from dataclasses import dataclass
 import struct
+from concurrent.futures import ThreadPoolExecutor
 from eth_keys import keys
-from Crypto.PublicKey import ECC
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from eth_account import Account
-from eth_account.messages import encode_defunct
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-BLOCK_SIZE = AES.block_size
+# numpy is optional; when it is available the batched XOR in prepare_IT_batch is vectorized
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BLOCK_SIZE = algorithms.AES.block_size // 8
 ADDRESS_SIZE = 20
 FUNC_SIG_SIZE = 4
 CT_SIZE = 32
 KEY_SIZE = 32
 
+# Expected lengths of the (sender, addr, func_sig, ct, key) inputs of signIT
+_EXPECTED_LENGTHS = (ADDRESS_SIZE, ADDRESS_SIZE, FUNC_SIG_SIZE, CT_SIZE, KEY_SIZE)
+
+# Order of the secp256k1 curve used by eth_keys for signing
+_SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# RSA-OAEP padding with SHA-256, shared by every RSA encryption and decryption
+_OAEP_SHA256 = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+# Overlapping the two RSA decryptions in recover_user_key only pays off with more than one core
+_PARALLEL_RSA = (os.cpu_count() or 1) > 1
+
+# A block viewed as two big-endian 64-bit words
+_WORDS = struct.Struct('>QQ')
+
+
+@functools.lru_cache(maxsize=128)
+def _cipher_for(key):
+    # The AES key schedule is computed once per key and the OpenSSL ECB encryptor is reused
+    return Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+
+
+def _py_xor_block(a, b):
+    # XOR two blocks as a pair of 64-bit words
+    a_high, a_low = _WORDS.unpack(a)
+    b_high, b_low = _WORDS.unpack(b)
+    return _WORDS.pack(a_high ^ b_high, a_low ^ b_low)
+
+# The native block XOR is optional; it is only available when the Cython extension is built
+try:
+    if __package__:
+        from ._crypto_fast import xor_block as _xor_block
+    else:
+        # Imported as a top-level module, as the tests do
+        from _crypto_fast import xor_block as _xor_block
+except ImportError:
+    _xor_block = _py_xor_block
 
 def encrypt(key, plaintext):
 
@@ -30,20 +76,25 @@ def encrypt(key, plaintext):
     if len(key) != BLOCK_SIZE:
         raise ValueError("Key size must be 128 bits.")
 
-    # Create a new AES cipher block using the provided key
-    cipher = AES.new(key, AES.MODE_ECB)
+    # Pad the plaintext with zeros if it's smaller than the block size, by copying it into a zeroed block
+    if len(plaintext) != BLOCK_SIZE:
+        buf = bytearray(BLOCK_SIZE)
+        buf[BLOCK_SIZE - len(plaintext):] = plaintext
+        plaintext = buf
+
+    return _encrypt_block(_cipher_for(bytes(key)), plaintext)
+
+def _encrypt_block(cipher, plaintext):
+    # Encrypt a plaintext of exactly the block size with an already created cipher block, without any checks
 
     # Generate a random value 'r' of the same length as the block size
-    r = get_random_bytes(BLOCK_SIZE)
+    r = secrets.token_bytes(BLOCK_SIZE)
 
     # Encrypt the random value 'r' using AES in ECB mode
-    encrypted_r = cipher.encrypt(r)
-
-    # Pad the plaintext with zeros if it's smaller than the block size
-    plaintext_padded = bytes(BLOCK_SIZE - len(plaintext)) + plaintext
+    encrypted_r = cipher.update(r)
 
-    # XOR the encrypted random value 'r' with the plaintext to obtain the ciphertext
-    ciphertext = bytes(x ^ y for x, y in zip(encrypted_r, plaintext_padded))
+    # XOR the encrypted random value 'r' with the plaintext, 64 bits at a time, to obtain the ciphertext
+    ciphertext = _xor_block(encrypted_r, plaintext)
 
     return ciphertext, r
 
@@ -60,14 +111,14 @@ def decrypt(key, r, ciphertext):
     if len(r) != BLOCK_SIZE:
         raise ValueError("Random size must be 128 bits.")
 
-    # Create a new AES cipher block using the provided key
-    cipher = AES.new(key, AES.MODE_ECB)
+    # Get the AES cipher block for the provided key
+    cipher = _cipher_for(bytes(key))
 
     # Encrypt the random value 'r' using AES in ECB mode
-    encrypted_r = cipher.encrypt(r)
+    encrypted_r = cipher.update(r)
 
     # XOR the encrypted random value 'r' with the ciphertext to obtain the plaintext
-    plaintext = bytes(x ^ y for x, y in zip(encrypted_r, ciphertext))
+    plaintext = _xor_block(encrypted_r, ciphertext)
 
     return plaintext
 
@@ -77,7 +128,7 @@ def load_aes_key(file_path):
         hex_key = file.read().strip()
 
     # Decode the hex string to binary
-    key = binascii.unhexlify(hex_key)
+    key = bytes.fromhex(hex_key)
 
     # Ensure the key is the correct length
     if len(key) != BLOCK_SIZE:
@@ -91,7 +142,7 @@ def write_aes_key(file_path, key):
         raise ValueError(f"Invalid key length: {len(key)} bytes, must be {BLOCK_SIZE} bytes")
 
     # Encode the key to hex string
-    hex_key = binascii.hexlify(key).decode()
+    hex_key = key.hex()
 
     # Write the hex-encoded key to the file
     with open(file_path, 'w') as file:
@@ -99,32 +150,40 @@ def write_aes_key(file_path, key):
 
 def generate_aes_key():
     # Generate a random 128-bit AES key
-    key = get_random_bytes(BLOCK_SIZE)
+    key = secrets.token_bytes(BLOCK_SIZE)
 
     return key
 
 def generate_ECDSA_private_key():
 
-    # Generate a new ECDSA private key
-    private_key = ECC.generate(curve='P-256')
-
-
-    # Get the raw bytes of the private key
-    return private_key.d.to_bytes(private_key.d.size_in_bytes(), byteorder='big')
+    # Draw random scalars until one is a valid secp256k1 private key, in the range [1, n)
+    while True:
+        private_key = int.from_bytes(os.urandom(KEY_SIZE), 'big')
+        if 1 <= private_key < _SECP256K1_ORDER:
+            # Get the raw bytes of the private key
+            return private_key.to_bytes(KEY_SIZE, byteorder='big')
 
 
 def validate_input_lengths(sender, addr, func_sig, ct, key):
     """Validate the lengths of inputs."""
-    if len(sender) != ADDRESS_SIZE:
-        raise ValueError(f"Invalid sender address length: {len(sender)} bytes, must be {ADDRESS_SIZE} bytes")
-    if len(addr) != ADDRESS_SIZE:
-        raise ValueError(f"Invalid contract address length: {len(addr)} bytes, must be {ADDRESS_SIZE} bytes")
-    if len(func_sig) != FUNC_SIG_SIZE:
-        raise ValueError(f"Invalid signature size: {len(func_sig)} bytes, must be {FUNC_SIG_SIZE} bytes")
-    if len(ct) != CT_SIZE:
-        raise ValueError(f"Invalid ct length: {len(ct)} bytes, must be {CT_SIZE} bytes")
-    if len(key) != KEY_SIZE:
-        raise ValueError(f"Invalid key length: {len(key)} bytes, must be {KEY_SIZE} bytes")
+    lengths = (len(sender), len(addr), len(func_sig), len(ct), len(key))
+    if lengths != _EXPECTED_LENGTHS:
+        _raise_length_mismatch(lengths)
+
+
+def _raise_length_mismatch(lengths):
+    """Raise an error naming the first input with an invalid length."""
+    sender_len, addr_len, func_sig_len, ct_len, key_len = lengths
+    if sender_len != ADDRESS_SIZE:
+        raise ValueError(f"Invalid sender address length: {sender_len} bytes, must be {ADDRESS_SIZE} bytes")
+    if addr_len != ADDRESS_SIZE:
+        raise ValueError(f"Invalid contract address length: {addr_len} bytes, must be {ADDRESS_SIZE} bytes")
+    if func_sig_len != FUNC_SIG_SIZE:
+        raise ValueError(f"Invalid signature size: {func_sig_len} bytes, must be {FUNC_SIG_SIZE} bytes")
+    if ct_len != CT_SIZE:
+        raise ValueError(f"Invalid ct length: {ct_len} bytes, must be {CT_SIZE} bytes")
+    if key_len != KEY_SIZE:
+        raise ValueError(f"Invalid key length: {key_len} bytes, must be {KEY_SIZE} bytes")
 
 
 def signIT(sender, addr, func_sig, ct, key, eip191=False):
@@ -133,7 +192,7 @@ def signIT(sender, addr, func_sig, ct, key, eip191=False):
     validate_input_lengths(sender, addr, func_sig, ct, key)
 
     # Create the message to be signed by appending all inputs
-    message = sender + addr + func_sig + ct
+    message = b"".join((sender, addr, func_sig, ct))
 
     # Sign the message
     if eip191:
@@ -150,9 +209,27 @@ def sign(message, key):
 
 
 def sign_eip191(message, key):
-    signed_message = Account.sign_message(encode_defunct(primitive=message), key)
-    return signed_message.signature
+    # Hash the message with the EIP-191 personal message prefix
+    message_hash = keccak256(b"".join((b"\x19Ethereum Signed Message:\n", str(len(message)).encode(), message)))
+
+    # Sign the hash and encode v as 27/28, as eth_account does
+    signature = keys.PrivateKey(key).sign_msg_hash(message_hash)
+    return signature.r.to_bytes(32, 'big') + signature.s.to_bytes(32, 'big') + bytes([signature.v + 27])
+
+
+@functools.lru_cache(maxsize=1024)
+def _addr_to_bytes(addr_str):
+    # Strip the '0x' prefix and decode the hex address
+    return bytes.fromhex(addr_str[2:])
 
+def _plaintext_to_block(plaintext):
+    # Encode a non-negative integer of 128 bits or smaller as exactly one block
+    if plaintext < 0:
+        raise ValueError("Plaintext must be a non-negative integer.")
+    try:
+        return plaintext.to_bytes(BLOCK_SIZE, 'big')
+    except OverflowError:
+        raise ValueError("Plaintext size must be 128 bits or smaller.") from None
 
 def prepare_IT(plaintext, user_aes_key, sender, contract, func_sig, signing_key, eip191=False):
     # Create the function signature
@@ -162,15 +239,19 @@ def prepare_IT(plaintext, user_aes_key, sender, contract, func_sig, signing_key,
 
 def inner_prepare_IT(plaintext, user_aes_key, sender, contract, func_sig_hash, signing_key, eip191):
     # Get addresses as bytes
-    sender_address_bytes = bytes.fromhex(sender.address[2:])
-    contract_address_bytes = bytes.fromhex(contract.address[2:])
+    sender_address_bytes = _addr_to_bytes(sender.address)
+    contract_address_bytes = _addr_to_bytes(contract.address)
 
-    # Convert the integer to a byte slice with size aligned to 8.
-    plaintext_bytes = plaintext.to_bytes((plaintext.bit_length() + 7) // 8, 'big')
+    # Ensure key size is 128 bits (16 bytes)
+    if len(user_aes_key) != BLOCK_SIZE:
+        raise ValueError("Key size must be 128 bits.")
 
-    # Encrypt the plaintext with the user's AES key
-    ciphertext, r = encrypt(user_aes_key, plaintext_bytes)
-    ct = ciphertext + r
+    # Convert the integer to a byte slice of exactly the block size, so it doesn't need to be padded
+    plaintext_bytes = _plaintext_to_block(plaintext)
+
+    # Encrypt the plaintext block with the user's AES key
+    ciphertext, r = _encrypt_block(_cipher_for(bytes(user_aes_key)), plaintext_bytes)
+    ct = b"".join((ciphertext, r))
 
     # Sign the message
     signature = signIT(sender_address_bytes, contract_address_bytes, func_sig_hash, ct, signing_key, eip191)
@@ -180,56 +261,142 @@ def inner_prepare_IT(plaintext, user_aes_key, sender, contract, func_sig_hash, s
 
     return ctInt, signature
 
+def prepare_IT_batch(plaintexts, user_aes_key, sender, contract, func_sig, signing_key, eip191=False):
+    """
+    This function prepares an IT for each of the given plaintexts. The AES key schedule, the random
+    generation and the AES encryption are each done once for the whole batch; only the signing is
+    done per plaintext.
 
-def generate_rsa_keypair():
+    Args:
+        plaintexts (list of int): The plaintexts to encrypt, each of 128 bits or smaller.
+        user_aes_key (bytes): The user's AES key.
+        sender: The sender account.
+        contract: The contract account.
+        func_sig (str): The function signature.
+        signing_key (bytes): The key used to sign the ITs.
+        eip191 (bool): Whether to use EIP-191 signing.
+
+    Returns:
+        list of tuple: The (ctInt, signature) pair of each plaintext, in order.
+    """
+    # Ensure key size is 128 bits (16 bytes)
+    if len(user_aes_key) != BLOCK_SIZE:
+        raise ValueError("Key size must be 128 bits.")
+
+    # Create the function signature
+    func_hash = get_func_sig(func_sig)
+
+    # Get addresses as bytes
+    sender_address_bytes = _addr_to_bytes(sender.address)
+    contract_address_bytes = _addr_to_bytes(contract.address)
+
+    # Pack all the plaintexts, padded to the block size, into a single buffer
+    plaintexts_padded = b"".join(_plaintext_to_block(plaintext) for plaintext in plaintexts)
+
+    # Generate a random value 'r' for every plaintext and encrypt them all in a single ECB call
+    rs = secrets.token_bytes(BLOCK_SIZE * len(plaintexts))
+    encrypted_rs = _cipher_for(bytes(user_aes_key)).update(rs)
+
+    # XOR the encrypted random values with the plaintexts to obtain the ciphertexts
+    if np is not None:
+        ciphertexts = np.bitwise_xor(
+            np.frombuffer(encrypted_rs, np.uint8).reshape(-1, BLOCK_SIZE),
+            np.frombuffer(plaintexts_padded, np.uint8).reshape(-1, BLOCK_SIZE)
+        ).tobytes()
+    else:
+        ciphertexts = (int.from_bytes(encrypted_rs, 'big') ^ int.from_bytes(plaintexts_padded, 'big')).to_bytes(len(rs), 'big')
+
+    result = []
+    for offset in range(0, len(rs), BLOCK_SIZE):
+        ct = b"".join((ciphertexts[offset:offset + BLOCK_SIZE], rs[offset:offset + BLOCK_SIZE]))
+
+        # Sign the message
+        signature = signIT(sender_address_bytes, contract_address_bytes, func_hash, ct, signing_key, eip191)
+
+        result.append((int.from_bytes(ct, byteorder='big'), signature))
+
+    return result
+
+
+@dataclass
+class RSAKeypair:
+    """
+    An RSA key pair that keeps the live key objects and only serializes them to DER when asked.
+
+    Unpacking it, as in `private_key_bytes, public_key_bytes = generate_lazy_rsa_keypair()`, gives
+    the serialized keys.
+    """
+    private_key: rsa.RSAPrivateKey
+    public_key: rsa.RSAPublicKey
+
+    @functools.cached_property
+    def private_bytes(self):
+        # Serialize private key
+        return self.private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+    @functools.cached_property
+    def public_bytes(self):
+        # Serialize public key
+        return self.public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def __iter__(self):
+        return iter((self.private_bytes, self.public_bytes))
+
+def generate_lazy_rsa_keypair():
     # Generate RSA key pair
     private_key = rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048
     )
 
-    # Serialize private key
-    private_key_bytes = private_key.private_bytes(
-        encoding=serialization.Encoding.DER,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    )
-    # Get public key
-    public_key = private_key.public_key()
-    # Serialize public key
-    public_key_bytes = public_key.public_bytes(
-        encoding=serialization.Encoding.DER,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
+    # Serialization is deferred until the key bytes are used
+    return RSAKeypair(private_key, private_key.public_key())
 
-    return private_key_bytes, public_key_bytes
+def generate_rsa_keypair():
+    # Generate RSA key pair and serialize both keys
+    return tuple(generate_lazy_rsa_keypair())
+
+@functools.lru_cache(maxsize=32)
+def _load_pub(public_key_bytes):
+    # Parse the DER public key once per key
+    return serialization.load_der_public_key(public_key_bytes)
+
+@functools.lru_cache(maxsize=32)
+def _load_priv(private_key_bytes):
+    # Parse the DER private key once per key
+    return serialization.load_der_private_key(private_key_bytes, password=None)
+
+def _as_public_key(public_key):
+    # Load public key, unless an already loaded key was given
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return public_key
+    return _load_pub(bytes(public_key))
+
+def _as_private_key(private_key):
+    # Load private key, unless an already loaded key was given
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return private_key
+    return _load_priv(bytes(private_key))
 
 def encrypt_rsa(public_key_bytes, plaintext):
     # Load public key
-    public_key = serialization.load_der_public_key(public_key_bytes)
+    public_key = _as_public_key(public_key_bytes)
     # Encrypt plaintext
-    ciphertext = public_key.encrypt(
-        plaintext,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
+    ciphertext = public_key.encrypt(plaintext, _OAEP_SHA256)
     return ciphertext
 
 def decrypt_rsa(private_key_bytes, ciphertext):
     # Load private key
-    private_key = serialization.load_der_private_key(private_key_bytes, password=None)
+    private_key = _as_private_key(private_key_bytes)
     # Decrypt ciphertext
-    plaintext = private_key.decrypt(
-        ciphertext,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
+    plaintext = private_key.decrypt(ciphertext, _OAEP_SHA256)
     return plaintext
 
 def recover_user_key(private_key_bytes, encrypted_key_share0, encrypted_key_share1):
@@ -238,31 +405,38 @@ def recover_user_key(private_key_bytes, encrypted_key_share0, encrypted_key_shar
     and then XORing the two key shares together.
 
     Args:
-        private_key_bytes (bytes): The private key used to decrypt the key shares.
+        private_key_bytes (bytes or RSAPrivateKey): The private key used to decrypt the key shares.
         encrypted_key_share0 (bytes): The first encrypted key share.
         encrypted_key_share1 (bytes): The second encrypted key share.
 
     Returns:
         bytes: The recovered user key.
     """
-    key_share0 = decrypt_rsa(private_key_bytes, encrypted_key_share0)
-    key_share1 = decrypt_rsa(private_key_bytes, encrypted_key_share1)
+    # Load the private key once for both key shares
+    private_key = _as_private_key(private_key_bytes)
+
+    if _PARALLEL_RSA:
+        # Decrypt the second key share on a worker thread while this thread decrypts the first,
+        # OpenSSL releases the GIL while doing the RSA operation. The worker is created per call
+        # so that it is never shared between callers or inherited across a fork
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future_key_share1 = executor.submit(private_key.decrypt, encrypted_key_share1, _OAEP_SHA256)
+            key_share0 = private_key.decrypt(encrypted_key_share0, _OAEP_SHA256)
+            key_share1 = future_key_share1.result()
+    else:
+        key_share0 = private_key.decrypt(encrypted_key_share0, _OAEP_SHA256)
+        key_share1 = private_key.decrypt(encrypted_key_share1, _OAEP_SHA256)
 
     # XOR both key shares to get the user key
-    return bytes([a ^ b for a, b in zip(key_share0, key_share1)])
+    return (int.from_bytes(key_share0, 'big') ^ int.from_bytes(key_share1, 'big')).to_bytes(len(key_share0), 'big')
 
 # Function to compute Keccak-256 hash
 def keccak256(data):
-    # Create Keccak-256 hash object
-    hash_obj = keccak.new(digest_bits=256)
-
-    # Update hash object with data
-    hash_obj.update(data)
-
-    # Compute hash and return
-    return hash_obj.digest()
+    # Create the Keccak-256 hash object with the data and compute the hash in a single call
+    return keccak.new(data=data, digest_bits=256).digest()
 
 
+@functools.lru_cache(maxsize=1024)
 def get_func_sig(functionSig):
     # Convert function signature to bytes
     functionSigBytes = functionSig.encode('utf-8')
@@ -1,10 +1,20 @@
 import unittest
 import tempfile
 import os
+import signal
 from Crypto.Random import get_random_bytes
-from crypto import encrypt, decrypt, load_aes_key, write_aes_key, generate_aes_key, signIT, generate_rsa_keypair, encrypt_rsa, decrypt_rsa, get_func_sig, prepare_IT, generate_ECDSA_private_key
+from crypto import encrypt, decrypt, load_aes_key, write_aes_key, generate_aes_key, signIT, generate_rsa_keypair, generate_lazy_rsa_keypair, encrypt_rsa, decrypt_rsa, recover_user_key, keccak256, get_func_sig, prepare_IT, prepare_IT_batch, generate_ECDSA_private_key
 from crypto import BLOCK_SIZE, ADDRESS_SIZE, FUNC_SIG_SIZE
+from crypto import _py_xor_block
+import crypto
+
+# The native accelerator is optional and only importable when the Cython extension is built
+try:
+    import _crypto_fast
+except ImportError:
+    _crypto_fast = None
 from eth_keys import keys
+from cryptography.hazmat.primitives import serialization
 from web3 import Account
 from eth_account.messages import encode_defunct
 
@@ -126,6 +136,29 @@ class TestMpcHelper(unittest.TestCase):
         with self.assertRaises(ValueError):
             decrypt(invalid_key, get_random_bytes(3), get_random_bytes(3))
 
+    def test_native_xor_block(self):
+        if _crypto_fast is None:
+            self.skipTest("_crypto_fast extension is not built")
+
+        # Arrange
+        a = get_random_bytes(BLOCK_SIZE)
+        b = get_random_bytes(BLOCK_SIZE)
+
+        # Act and Assert
+        # Ensure encrypt and decrypt use the native XOR when it is built
+        self.assertIs(_crypto_fast.xor_block, crypto._xor_block)
+
+        # Ensure the native XOR matches the pure Python one, for bytes and bytearray inputs
+        self.assertEqual(_py_xor_block(a, b), _crypto_fast.xor_block(a, b))
+        self.assertEqual(_py_xor_block(a, b), _crypto_fast.xor_block(a, bytearray(b)))
+        self.assertEqual(bytes(BLOCK_SIZE), _crypto_fast.xor_block(a, a))
+
+        # Expect an error to be thrown when a block has the wrong length
+        with self.assertRaises(ValueError):
+            _crypto_fast.xor_block(a, b[1:])
+        with self.assertRaises(ValueError):
+            _crypto_fast.xor_block(a + b, b)
+
     def test_signature(self):
         # Arrange
         sender = os.urandom(ADDRESS_SIZE)
@@ -156,6 +189,27 @@ class TestMpcHelper(unittest.TestCase):
         # Assert
         self.assertEqual(verified, True)
 
+    def test_invalid_signature_input_lengths(self):
+        # Arrange
+        sender = os.urandom(ADDRESS_SIZE)
+        addr = os.urandom(ADDRESS_SIZE)
+        func_sig = os.urandom(FUNC_SIG_SIZE)
+        ct = os.urandom(2 * BLOCK_SIZE)
+        key = generate_ECDSA_private_key()
+
+        # Act and Assert
+        # Expect an error naming the invalid input to be thrown when signing
+        with self.assertRaisesRegex(ValueError, "sender address"):
+            signIT(sender[1:], addr, func_sig, ct, key)
+        with self.assertRaisesRegex(ValueError, "contract address"):
+            signIT(sender, addr[1:], func_sig, ct, key)
+        with self.assertRaisesRegex(ValueError, "signature size"):
+            signIT(sender, addr, func_sig[1:], ct, key)
+        with self.assertRaisesRegex(ValueError, "ct length"):
+            signIT(sender, addr, func_sig, ct[1:], key)
+        with self.assertRaisesRegex(ValueError, "key length"):
+            signIT(sender, addr, func_sig, ct, key[1:])
+
     def test_signature_eip191(self):
         # Arrange
         sender = os.urandom(ADDRESS_SIZE)
@@ -256,6 +310,82 @@ class TestMpcHelper(unittest.TestCase):
         decrypted_integer = int.from_bytes(decrypted, 'big')
         self.assertEqual(plaintext, decrypted_integer)
 
+    def test_prepareIT_invalid_plaintext(self):
+        # Arrange
+        userKey = bytes.fromhex("b3c3fe73c1bb91862b166a29fe1d63e9")
+        sender = Account()
+        sender.address = "0xd67fe7792f18fbd663e29818334a050240887c28"
+        contract = Account()
+        contract.address = "0x69413851f025306dbe12c48ff2225016fc5bbe1b"
+        signingKey = bytes.fromhex("3840f44be5805af188e9b42dda56eb99eefc88d7a6db751017ff16d0c5f8143e")
+
+        # Act and Assert
+        # Expect an error to be thrown for a plaintext wider than 128 bits
+        with self.assertRaisesRegex(ValueError, "128 bits or smaller"):
+            prepare_IT(2**128, userKey, sender, contract, "test(bytes)", signingKey)
+
+        # Expect an error to be thrown for a negative plaintext
+        with self.assertRaisesRegex(ValueError, "non-negative"):
+            prepare_IT(-1, userKey, sender, contract, "test(bytes)", signingKey)
+
+    def test_prepareIT_batch(self):
+        # Arrange
+        plaintexts = [0, 100, 2**128 - 1]
+        userKey = bytes.fromhex("b3c3fe73c1bb91862b166a29fe1d63e9")
+        # Create an account object manually
+        sender = Account()
+        sender.address = "0xd67fe7792f18fbd663e29818334a050240887c28"
+        contract = Account()
+        contract.address = "0x69413851f025306dbe12c48ff2225016fc5bbe1b"
+        func_sig = "test(bytes)"
+        signingKey = bytes.fromhex("3840f44be5805af188e9b42dda56eb99eefc88d7a6db751017ff16d0c5f8143e")
+
+        # Act
+        results = prepare_IT_batch(plaintexts, userKey, sender, contract, func_sig, signingKey)
+
+        # Assert
+        self.assertEqual(len(plaintexts), len(results))
+
+        sender_address_bytes = bytes.fromhex(sender.address[2:])
+        contract_address_bytes = bytes.fromhex(contract.address[2:])
+        func_hash = get_func_sig(func_sig)
+        pk = keys.PrivateKey(signingKey)
+
+        for plaintext, (ct, signature) in zip(plaintexts, results):
+            ctBytes = ct.to_bytes(2 * BLOCK_SIZE, 'big')
+
+            # Verify the signature against the message hash and the public key
+            message = sender_address_bytes + contract_address_bytes + func_hash + ctBytes
+            verified = keys.Signature(signature).verify_msg(message, pk.public_key)
+            self.assertEqual(verified, True)
+
+            decrypted = decrypt(userKey, ctBytes[BLOCK_SIZE:], ctBytes[:BLOCK_SIZE])
+            self.assertEqual(plaintext, int.from_bytes(decrypted, 'big'))
+
+    def test_prepareIT_batch_invalid_inputs(self):
+        # Arrange
+        userKey = bytes.fromhex("b3c3fe73c1bb91862b166a29fe1d63e9")
+        sender = Account()
+        sender.address = "0xd67fe7792f18fbd663e29818334a050240887c28"
+        contract = Account()
+        contract.address = "0x69413851f025306dbe12c48ff2225016fc5bbe1b"
+        func_sig = "test(bytes)"
+        signingKey = bytes.fromhex("3840f44be5805af188e9b42dda56eb99eefc88d7a6db751017ff16d0c5f8143e")
+
+        # Act and Assert
+        # Expect an error to be thrown for an invalid AES key length
+        with self.assertRaisesRegex(ValueError, "Key size"):
+            prepare_IT_batch([100], userKey[1:], sender, contract, func_sig, signingKey)
+
+        # Expect the same errors as prepare_IT for a plaintext wider than 128 bits or negative
+        with self.assertRaisesRegex(ValueError, "128 bits or smaller"):
+            prepare_IT_batch([100, 2**128], userKey, sender, contract, func_sig, signingKey)
+        with self.assertRaisesRegex(ValueError, "non-negative"):
+            prepare_IT_batch([100, -1], userKey, sender, contract, func_sig, signingKey)
+
+        # An empty batch prepares no ITs
+        self.assertEqual([], prepare_IT_batch([], userKey, sender, contract, func_sig, signingKey))
+
     def test_rsa_encryption(self):
         # Arrange
         plaintext = b"hello world"
@@ -272,8 +402,102 @@ class TestMpcHelper(unittest.TestCase):
 
         decrypted = decrypt_rsa(private_key, ciphertext)
 
+        # The private key can also be given already loaded
+        loaded_private_key = serialization.load_der_private_key(private_key, password=None)
+        decrypted_with_loaded_key = decrypt_rsa(loaded_private_key, ciphertext)
+
+        # Assert
+        self.assertEqual(plaintext, decrypted)
+        self.assertEqual(plaintext, decrypted_with_loaded_key)
+
+    def test_rsa_keypair_tuple(self):
+        # Act
+        keypair = generate_rsa_keypair()
+
+        # Assert
+        # Ensure the key pair is still a (private_key_bytes, public_key_bytes) tuple
+        self.assertIsInstance(keypair, tuple)
+        self.assertEqual(2, len(keypair))
+        self.assertIsInstance(keypair[0], bytes)
+        self.assertIsInstance(keypair[1], bytes)
+        self.assertEqual(keypair, (keypair[0], keypair[1]))
+
+    def test_rsa_keypair_key_objects(self):
+        # Arrange
+        plaintext = b"hello world"
+        keypair = generate_lazy_rsa_keypair()
+
+        # Act
+        ciphertext = encrypt_rsa(keypair.public_key, plaintext)
+        decrypted = decrypt_rsa(keypair.private_key, ciphertext)
+
         # Assert
         self.assertEqual(plaintext, decrypted)
+        self.assertEqual((keypair.private_bytes, keypair.public_bytes), tuple(keypair))
+        self.assertEqual(plaintext, decrypt_rsa(keypair.private_bytes, encrypt_rsa(keypair.public_bytes, plaintext)))
+
+    def test_recover_user_key(self):
+        # Arrange
+        user_key = generate_aes_key()
+        key_share0 = get_random_bytes(BLOCK_SIZE)
+        key_share1 = bytes(x ^ y for x, y in zip(user_key, key_share0))
+        private_key, public_key = generate_rsa_keypair()
+        encrypted_key_share0 = encrypt_rsa(public_key, key_share0)
+        encrypted_key_share1 = encrypt_rsa(public_key, key_share1)
+
+        # Act
+        recovered_key = recover_user_key(private_key, encrypted_key_share0, encrypted_key_share1)
+
+        # Assert
+        self.assertEqual(user_key, recovered_key)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_recover_user_key_after_fork(self):
+        # Arrange
+        user_key = generate_aes_key()
+        key_share0 = get_random_bytes(BLOCK_SIZE)
+        key_share1 = bytes(x ^ y for x, y in zip(user_key, key_share0))
+        private_key, public_key = generate_rsa_keypair()
+        encrypted_key_share0 = encrypt_rsa(public_key, key_share0)
+        encrypted_key_share1 = encrypt_rsa(public_key, key_share1)
+
+        # Force the threaded decryption path, even on a single core host
+        parallel_rsa = crypto._PARALLEL_RSA
+        crypto._PARALLEL_RSA = True
+        try:
+            # Act
+            # Recover the key in the parent, then again in a forked child
+            self.assertEqual(user_key, recover_user_key(private_key, encrypted_key_share0, encrypted_key_share1))
+
+            pid = os.fork()
+            if pid == 0:
+                # Kill the child if it deadlocks
+                signal.alarm(5)
+                try:
+                    recovered_key = recover_user_key(private_key, encrypted_key_share0, encrypted_key_share1)
+                    os._exit(0 if recovered_key == user_key else 1)
+                except BaseException:
+                    os._exit(1)
+
+            _, status = os.waitpid(pid, 0)
+        finally:
+            crypto._PARALLEL_RSA = parallel_rsa
+
+        # Assert
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(0, os.WEXITSTATUS(status))
+
+    def test_keccak256(self):
+        # Arrange
+        data = b"abc"
+
+        # Act
+        hashed = keccak256(data)
+
+        # Assert
+        # Ensure the hash matches the known Keccak-256 digest, for bytes and other buffer inputs
+        self.assertEqual("4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45", hashed.hex())
+        self.assertEqual(hashed, keccak256(memoryview(data)))
 
     def test_get_func_sig(self):
         # Arrange
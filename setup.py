@@ -1,9 +1,30 @@
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
 
 # Read requirements from the requirements.txt file
 with open('requirements.txt') as f:
     install_requires = f.read().strip().split('\n')
 
+# The native accelerator is optional: it is skipped when Cython is missing
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        [Extension('soda_python_sdk._crypto_fast', ['python/soda_python_sdk/_crypto_fast.pyx'])],
+        language_level=3,
+    )
+
+
+class optional_build_ext(build_ext):
+    # A failed native build (e.g. no C compiler) only warns, the SDK then falls back to pure Python
+    def run(self):
+        try:
+            super().run()
+        except Exception as e:
+            self.warn(f"building the native accelerator failed, falling back to pure Python: {e}")
+
 setup(
     name='soda-python-sdk',
     version='0.1.7',
@@ -21,6 +42,8 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.8',
     install_requires=install_requires,
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
 )
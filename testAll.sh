@@ -10,6 +10,10 @@ cd js
 npx mocha --require esm --grep "^(?!.*should decrypt a message using RSA scheme$)" test.mjs
 cd ..
 
+print_blue "Building python native accelerator..."
+pip install cython
+python3 setup.py build_ext --inplace
+
 print_blue "Running python tests..."
 cd python/soda_python_sdk || exit
 python3 -m unittest -v test.py -k "TestMpcHelper"